@@ -1,5 +1,10 @@
-import pandas as pd
-from flask import Flask, request, jsonify
+import os
+import threading
+from collections import namedtuple
+import orjson
+from python_calamine import CalamineError, CalamineWorkbook
+from flask import Flask, Response, request, jsonify, stream_with_context
+from werkzeug.serving import is_running_from_reloader
 
 app = Flask(__name__)
 
@@ -45,6 +50,174 @@ MEALS = {
 
 MEAL_ORDER = ["BreakfastPlan", "LunchPlan", "DinnerPlan"]
 
+MEAL_CATEGORIES = ["fruit_veg", "cereal", "dairy", "protein", "oil"]
+
+# Servings needed per category for a whole day (sum over all meals)
+DAILY_NEED = {cat: sum(MEALS[m][cat] for m in MEAL_ORDER) for cat in MEAL_CATEGORIES}
+
+# Flat per-day schedule: (meal_time, requirements, ((category, needed), ...))
+# with categories that need nothing already left out
+MEAL_SCHEDULE = [
+    (
+        meal_key.replace("Plan",""),
+        MEALS[meal_key],
+        tuple((cat, needed) for cat, needed in MEALS[meal_key].items() if needed > 0)
+    )
+    for meal_key in MEAL_ORDER
+]
+
+###############################################################################
+# Workbook cache
+###############################################################################
+# Parsed workbook results, keyed by (path, sheet) => (stamp, result).
+# The stamp is the file's mtime (plus the ref_map used, for inventory
+# sheets); a different stamp means the entry is stale and gets re-parsed.
+# _INVENTORY_LOCK serializes loads so concurrent requests share one parse.
+_EXCEL_CACHE = {}
+_INVENTORY_LOCK = threading.RLock()
+
+def _file_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        raise Exception(f"Cannot find '{path}'.")
+
+def _cache_get(path, sheet_name, stamp):
+    entry = _EXCEL_CACHE.get((path, sheet_name))
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+    return None
+
+def _cache_put(path, sheet_name, stamp, result):
+    _EXCEL_CACHE[(path, sheet_name)] = (stamp, result)
+
+def _read_sheet_rows(path, sheet_name=None):
+    """
+    Reads one sheet with python-calamine, without building a DataFrame.
+    Returns (header, rows) as plain Python values; sheet_name=None => first sheet.
+    """
+    wb = CalamineWorkbook.from_path(path)
+    if sheet_name is None:
+        sheet = wb.get_sheet_by_index(0)
+    else:
+        sheet = wb.get_sheet_by_name(sheet_name)
+    rows = sheet.to_python(skip_empty_area=False)
+    if not rows:
+        return [], []
+    return rows[0], rows[1:]
+
+def _is_nan(value):
+    return isinstance(value, float) and value != value
+
+# Cell strings pandas' read_excel treats as missing values
+_NA_STRINGS = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+    "nan", "null"
+}
+
+def _parse_number(text):
+    """Numeric cell text as pandas reads it: "3" => 3, "2.5" => 2.5, else None."""
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def _sheet_records(header, rows):
+    """
+    Builds the same records pd.read_excel(...).to_dict(orient="records")
+    gave for a sheet:
+      - trailing blank cells and rows are trimmed; blank rows in between
+        stay as all-NaN records
+      - blank headers become "Unnamed: <i>", repeated headers get ".1", ".2", ...
+      - missing cells and NA strings ("", "NA", "n/a", ...) are NaN
+      - a column whose cells are all numbers, numeric text, bools or NaN is
+        converted like pandas does: floats if it has any NaN or fraction,
+        ints otherwise (bools stay bools if that's all there is)
+      - other columns keep their cells as read
+    Dates stay datetime/date objects rather than pd.Timestamp; they
+    serialize the same way.
+    """
+    table = []
+    for row in [header] + rows:
+        end = len(row)
+        while end and row[end - 1] == "":
+            end -= 1
+        table.append(list(row[:end]))
+    while table and not table[-1]:
+        table.pop()
+    if not table:
+        return []
+    width = max(len(row) for row in table)
+    for row in table:
+        row.extend([""] * (width - len(row)))
+    header, table = table[0], table[1:]
+
+    columns = []
+    counts = {}
+    for j, h in enumerate(header):
+        col = f"Unnamed: {j}" if h == "" else h
+        if isinstance(col, float) and col.is_integer():
+            col = int(col)
+        cur = counts.get(col, 0)
+        while cur > 0:
+            counts[col] = cur + 1
+            col = f"{col}.{cur}"
+            cur = counts.get(col, 0)
+        counts[col] = cur + 1
+        columns.append(col)
+
+    def convert(cell):
+        if isinstance(cell, str) and cell in _NA_STRINGS:
+            return float("nan")
+        if isinstance(cell, float) and cell.is_integer():
+            return int(cell)
+        return cell
+
+    table = [[convert(cell) for cell in row] for row in table]
+
+    for j in range(width):
+        numbers = []
+        for value in (row[j] for row in table):
+            if isinstance(value, str):
+                value = _parse_number(value)
+                if value is None:
+                    break
+            elif not isinstance(value, (int, float)):
+                break
+            numbers.append(value)
+        else:
+            if any(isinstance(v, float) for v in numbers):
+                numbers = [float(v) for v in numbers]
+            elif not all(isinstance(v, bool) for v in numbers):
+                numbers = [int(v) for v in numbers]
+            for row, value in zip(table, numbers):
+                row[j] = value
+            continue
+
+        # Text column: like pandas, equal cells share the first one's value
+        # (so a 1 after a True reads as True)
+        memo = {}
+        for row in table:
+            row[j] = memo.setdefault(row[j], row[j])
+
+    return [dict(zip(columns, row)) for row in table]
+
+def _to_float(value, default):
+    """Same as pd.to_numeric(errors="coerce").fillna(default) for one cell."""
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return default
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+        return default
+    return float(value)
+
 ###############################################################################
 # 3) Load Food Reference from "DATA SET FOOD CATEGORY.xlsx"
 ###############################################################################
@@ -53,38 +226,69 @@ def load_food_reference():
     Reads 'data/DATA SET FOOD CATEGORY.xlsx'.
     Must have columns:
       item_name, item_category, servings_per_unit
-    Returns a dict:
-      ref_map[item_name_lower] = {
-         "raw_category": ...,
-         "servings_per_unit": ...
-      }
+    Returns a tuple of parallel dicts keyed by item_name_lower:
+      ref_cat[name] = CATEGORY_MAP key (e.g. "fruit_veg")
+      ref_su[name]  = servings_per_unit
+    Items whose raw category is not in CATEGORY_MAP are left out.
     """
     path = "data/DATA SET FOOD CATEGORY.xlsx"
+    mtime = _file_mtime(path)
+    cached = _cache_get(path, None, mtime)
+    if cached is not None:
+        return cached
+
     try:
-        df = pd.read_excel(path)
-    except FileNotFoundError:
-        raise Exception(f"Cannot find '{path}'.")
-    except ValueError:
+        header, rows = _read_sheet_rows(path)
+    except CalamineError:
         raise Exception(f"Error reading '{path}'—check sheet name, columns, etc.")
 
     needed_cols = ["item_name","item_category","servings_per_unit"]
     for c in needed_cols:
-        if c not in df.columns:
+        if c not in header:
             raise Exception(f"Column '{c}' missing in '{path}'.")
+    name_i, cat_i, su_i = (header.index(c) for c in needed_cols)
+
+    ref_cat = {}
+    ref_su = {}
+    for row in rows:
+        name = str(row[name_i]).strip().lower()
+        mapped_cat = CATEGORY_MAP.get(str(row[cat_i]).strip().lower(), None)
+        if not name or mapped_cat is None:
+            continue
+        ref_cat[name] = mapped_cat
+        ref_su[name] = _to_float(row[su_i], 1.0)
+    ref_map = (ref_cat, ref_su)
 
-    df["servings_per_unit"] = pd.to_numeric(df["servings_per_unit"], errors="coerce").fillna(1)
-
-    ref_map = {}
-    for _, row in df.iterrows():
-        name = str(row["item_name"]).strip().lower()
-        raw_cat = str(row["item_category"]).strip().lower()
-        su = float(row["servings_per_unit"])
-        ref_map[name] = {
-            "raw_category": raw_cat,
-            "servings_per_unit": su
-        }
+    _cache_put(path, None, mtime, ref_map)
     return ref_map
 
+def build_item_list(names, qtys, ref_map, label):
+    """
+    Turns parallel item_name / quantity sequences into
+    [{ item_name, category, servings_available, usage_id }] using ref_map.
+    'servings_available' = quantity * servings_per_unit
+    'usage_id' is a dense id per (item_name, category), so rows listing the
+    same item share one id and their usage is summed together.
+    """
+    ref_cat, ref_su = ref_map
+    item_list = []
+    usage_ids = {}
+    for name, qty in zip(names, qtys):
+        # lookup in reference
+        item_n = str(name).strip().lower()
+        mapped_cat = ref_cat.get(item_n, None)
+        if mapped_cat is None:
+            print(f"Skipping {label} item '{name}' (not found in reference or category not recognized).")
+            continue
+
+        item_list.append({
+            "item_name": name,
+            "category": mapped_cat,
+            "servings_available": qty * ref_su[item_n],
+            "usage_id": usage_ids.setdefault((name, mapped_cat), len(usage_ids))
+        })
+    return item_list
+
 ###############################################################################
 # 4) Senior Box
 ###############################################################################
@@ -97,6 +301,7 @@ def load_senior_box_data_and_list(cycle_month=1, ref_map=None):
     Expects columns:
       item_name, quantity
     Then uses ref_map (from DATA SET FOOD CATEGORY.xlsx) to find category & su.
+    Items not in ref_map (or with an unrecognized category) are skipped.
     'servings_available' = quantity * su
     Returns:
       box_original: raw data records
@@ -110,44 +315,31 @@ def load_senior_box_data_and_list(cycle_month=1, ref_map=None):
         sheet_name = "Senior Box Third Month"
 
     path = "data/senior_box.xlsx"
+    mtime = _file_mtime(path)
+    stamp = (mtime, ref_map)
+    cached = _cache_get(path, sheet_name, stamp)
+    if cached is not None:
+        return cached
+
     try:
-        df = pd.read_excel(path, sheet_name=sheet_name)
-    except FileNotFoundError:
-        raise Exception(f"Cannot find '{path}'.")
-    except ValueError:
+        header, rows = _read_sheet_rows(path, sheet_name)
+    except CalamineError:
         raise Exception(f"Worksheet '{sheet_name}' not found in '{path}'.")
 
-    box_original = df.to_dict(orient="records")
+    box_original = _sheet_records(header, rows)
 
-    if "item_name" not in df.columns or "quantity" not in df.columns:
+    if "item_name" not in header or "quantity" not in header:
         raise Exception(f"'item_name' or 'quantity' missing in sheet '{sheet_name}' of '{path}'.")
 
-    df["quantity"] = pd.to_numeric(df["quantity"], errors="coerce").fillna(0)
-
-    box_list = []
-    for _, row in df.iterrows():
-        item_n = str(row["item_name"]).strip().lower()
-        qty = float(row["quantity"])
-
-        # lookup in reference
-        if item_n not in ref_map:
-            print(f"Skipping senior box item '{row['item_name']}' (not found in reference).")
-            continue
-
-        raw_cat = ref_map[item_n]["raw_category"]
-        su = ref_map[item_n]["servings_per_unit"]
-        mapped_cat = CATEGORY_MAP.get(raw_cat, None)
-        if mapped_cat is None:
-            print(f"Skipping box item '{row['item_name']}', raw cat '{raw_cat}' not recognized.")
-            continue
-
-        total_serv = qty * su
-        box_list.append({
-            "item_name": row["item_name"],
-            "category": mapped_cat,
-            "servings_available": total_serv
-        })
+    records = [r for r in box_original if not _is_nan(r["item_name"])]
+    box_list = build_item_list(
+        [r["item_name"] for r in records],
+        [_to_float(r["quantity"], 0.0) for r in records],
+        ref_map,
+        "senior box"
+    )
 
+    _cache_put(path, sheet_name, stamp, (box_original, box_list))
     return box_original, box_list
 
 ###############################################################################
@@ -162,111 +354,69 @@ def load_main_inventory_items(ref_map=None):
     """
     path = "data/excel_file.xlsx"
     sheet_name = "Inventory"
+    mtime = _file_mtime(path)
+    stamp = (mtime, ref_map)
+    cached = _cache_get(path, sheet_name, stamp)
+    if cached is not None:
+        return cached
+
     try:
-        df = pd.read_excel(path, sheet_name=sheet_name)
-    except FileNotFoundError:
-        raise Exception(f"Cannot find '{path}'.")
-    except ValueError:
+        header, rows = _read_sheet_rows(path, sheet_name)
+    except CalamineError:
         raise Exception(f"Worksheet '{sheet_name}' not found in '{path}'.")
 
     needed_cols = ["item_name","quantity_in_stock"]
     for c in needed_cols:
-        if c not in df.columns:
+        if c not in header:
             raise Exception(f"Column '{c}' missing in '{sheet_name}' of '{path}'.")
+    name_i, qty_i = (header.index(c) for c in needed_cols)
 
-    df["quantity_in_stock"] = pd.to_numeric(df["quantity_in_stock"], errors="coerce").fillna(0)
-
-    main_list = []
-    for _, row in df.iterrows():
-        item_n = str(row["item_name"]).strip().lower()
-        qty_in_stock = float(row["quantity_in_stock"])
+    rows = [row for row in rows if row[name_i] != ""]
+    main_list = build_item_list(
+        [row[name_i] for row in rows],
+        [_to_float(row[qty_i], 0.0) for row in rows],
+        ref_map,
+        "main"
+    )
 
-        # lookup item_name in reference
-        if item_n not in ref_map:
-            print(f"Skipping main item '{row['item_name']}' (not found in reference).")
-            continue
-
-        raw_cat = ref_map[item_n]["raw_category"]
-        su = ref_map[item_n]["servings_per_unit"]
-        mapped_cat = CATEGORY_MAP.get(raw_cat, None)
-        if mapped_cat is None:
-            print(f"Skipping main item '{row['item_name']}', raw cat '{raw_cat}' not recognized.")
-            continue
-
-        total_serv = qty_in_stock * su
-        main_list.append({
-            "item_name": row["item_name"],
-            "category": mapped_cat,
-            "servings_available": total_serv
-        })
+    _cache_put(path, sheet_name, stamp, main_list)
     return main_list
 
 ###############################################################################
 # 6) Allocation Logic
 ###############################################################################
-def allocate_category(box_list, main_list, category, needed):
+# items = box_list + main_list is the read-only item table; the servings
+# still available for each item live in the parallel list `serv`, with
+# is_box marking the senior box entries. cat_idx holds the positions
+# of one category's items, box items first, so box stock is used up first.
+# Each used entry is a Used(item position, servings_used, from_box) tuple;
+# it's only expanded into a dict for the response.
+Used = namedtuple("Used", "item_id servings_used from_box")
+
+def allocate_category(serv, cat_idx, is_box, needed):
     used_details = []
     needed_left = needed
 
-    # Box first
-    for item in box_list:
-        if item["category"] == category and needed_left > 0:
-            if item["servings_available"] >= needed_left:
-                used_details.append({
-                    "item_name": item["item_name"],
-                    "category": category,
-                    "servings_used": needed_left,
-                    "from": "box"
-                })
-                item["servings_available"] -= needed_left
-                needed_left = 0
-                break
-            else:
-                if item["servings_available"] > 0:
-                    used_details.append({
-                        "item_name": item["item_name"],
-                        "category": category,
-                        "servings_used": item["servings_available"],
-                        "from": "box"
-                    })
-                    needed_left -= item["servings_available"]
-                    item["servings_available"] = 0
-
-    # Then main
-    if needed_left > 0:
-        for item in main_list:
-            if item["category"] == category and needed_left > 0:
-                if item["servings_available"] >= needed_left:
-                    used_details.append({
-                        "item_name": item["item_name"],
-                        "category": category,
-                        "servings_used": needed_left,
-                        "from": "main"
-                    })
-                    item["servings_available"] -= needed_left
-                    needed_left = 0
-                    break
-                else:
-                    if item["servings_available"] > 0:
-                        used_details.append({
-                            "item_name": item["item_name"],
-                            "category": category,
-                            "servings_used": item["servings_available"],
-                            "from": "main"
-                        })
-                        needed_left -= item["servings_available"]
-                        item["servings_available"] = 0
+    # cat_idx lists box items first, so box stock is drawn down before main
+    for i in cat_idx:
+        # needed_left first, so a tie gives back the int need (as before)
+        take = min(needed_left, serv[i])
+        if take <= 0:
+            continue
+        used_details.append(Used(i, take, is_box[i]))
+        serv[i] -= take
+        needed_left -= take
+        if needed_left == 0:
+            break
 
     shortage_flag = (needed_left > 0)
     return used_details, needed_left, shortage_flag
 
-def allocate_meal(box_list, main_list, meal_plan):
+def allocate_meal(serv, cat_idx, is_box, meal_needs):
     used_items = []
     shortage_any = False
-    for cat, needed in meal_plan.items():
-        if needed <= 0:
-            continue
-        cat_used, leftover, short = allocate_category(box_list, main_list, cat, needed)
+    for cat, needed in meal_needs:
+        cat_used, leftover, short = allocate_category(serv, cat_idx[cat], is_box, needed)
         used_items.extend(cat_used)
         if short:
             shortage_any = True
@@ -275,26 +425,43 @@ def allocate_meal(box_list, main_list, meal_plan):
 ###############################################################################
 # 7) Summaries
 ###############################################################################
-def summarize_day_usage(day_meals):
-    from collections import defaultdict
+def describe_used(items, used_items):
+    """
+    Expands Used entries into
+    { item_name, category, servings_used, from } dicts.
+    """
+    described = []
+    for used in used_items:
+        item = items[used.item_id]
+        described.append({
+            "item_name": item["item_name"],
+            "category": item["category"],
+            "servings_used": used.servings_used,
+            "from": "box" if used.from_box else "main"
+        })
+    return described
 
-    box_usage_map = defaultdict(float)
-    main_usage_map = defaultdict(float)
+def summarize_day_usage(day_meals, items):
+    # usage_id => [item, total servings used], in order of first use
+    box_usage_map = {}
+    main_usage_map = {}
 
     for meal in day_meals:
         for used in meal["used_items"]:
-            key = (used["item_name"], used["category"])
-            if used["from"] == "box":
-                box_usage_map[key] += used["servings_used"]
+            item = items[used.item_id]
+            usage_map = box_usage_map if used.from_box else main_usage_map
+            entry = usage_map.get(item["usage_id"])
+            if entry is None:
+                usage_map[item["usage_id"]] = [item, float(used.servings_used)]
             else:
-                main_usage_map[key] += used["servings_used"]
+                entry[1] += used.servings_used
 
     def map_to_list(usage_map):
         arr = []
-        for (item_n, cat), total_used in usage_map.items():
+        for item, total_used in usage_map.values():
             arr.append({
-                "item_name": item_n,
-                "category": cat,
+                "item_name": item["item_name"],
+                "category": item["category"],
                 "servings_used": total_used
             })
         return arr
@@ -306,46 +473,70 @@ def summarize_day_usage(day_meals):
 ###############################################################################
 # 8) Generate Plan
 ###############################################################################
-def generate_monthly_plan(month=1):
-    import copy
-
-    # 1) Load reference
-    ref_map = load_food_reference()
-
-    # 2) Decide cycle
-    cyc = get_cycle_month(month)
+def load_plan_inventory(cycle_month=1):
+    """
+    Loads the food reference, the senior box for `cycle_month` and the main
+    inventory. Results come from the workbook cache unless a file changed
+    on disk, and loading is serialized across threads.
+    Returns:
+      box_original, box_list, main_list
+    """
+    with _INVENTORY_LOCK:
+        ref_map = load_food_reference()
+        box_original, box_list = load_senior_box_data_and_list(cycle_month, ref_map)
+        main_list = load_main_inventory_items(ref_map)
+    return box_original, box_list, main_list
 
-    # 3) Load box
-    box_original, box_list = load_senior_box_data_and_list(cyc, ref_map)
+def warm_inventory_cache():
+    for cyc in (1, 2, 3):
+        load_plan_inventory(cyc)
 
-    # 4) Load main
-    main_list = load_main_inventory_items(ref_map)
+def iter_day_plans(box_list, main_list, day_shortages):
+    """
+    Plans the month one day at a time, yielding each finished day_info.
+    Shortage days are also appended to `day_shortages` as they're found.
+    """
+    # Only the servings change during allocation, so track them in one
+    # flat list: box items at [0, n_box), main items after them
+    items = box_list + main_list
+    n_box = len(box_list)
+    serv = [item["servings_available"] for item in items]
+    is_box = [i < n_box for i in range(len(items))]
+
+    # Item positions per category (box first), so allocation only walks matching items
+    cat_idx = {
+        cat: [i for i, item in enumerate(items) if item["category"] == cat]
+        for cat in MEAL_CATEGORIES
+    }
 
-    day_plans = []
-    day_shortages = []
+    # Running servings left per category (box + main); items at or below
+    # zero are never drawn from, so they don't count towards the total
+    cat_left = {cat: sum(max(serv[i], 0) for i in cat_idx[cat]) for cat in MEAL_CATEGORIES}
 
     for day_num in range(1, 31):
-        backup_box = copy.deepcopy(box_list)
-        backup_main = copy.deepcopy(main_list)
-
         day_meals = []
-        shortage_for_day = False
-
-        for meal_key in MEAL_ORDER:
-            meal_req = MEALS[meal_key]
-            used_items, shortage_any = allocate_meal(box_list, main_list, meal_req)
-            day_meals.append({
-                "meal_time": meal_key.replace("Plan",""),
-                "meal_plan_requirements": meal_req,
-                "used_items": used_items
-            })
-            if shortage_any:
-                shortage_for_day = True
-                break
+
+        # A day that cannot be covered is a shortage without trying to allocate
+        # (with a little slack, since the running float sums can land just under a need)
+        shortage_for_day = any(cat_left[cat] < need - 1e-9 for cat, need in DAILY_NEED.items())
+        if not shortage_for_day:
+            serv_snap = serv[:]
+
+            for meal_time, meal_req, meal_needs in MEAL_SCHEDULE:
+                used_items, shortage_any = allocate_meal(serv, cat_idx, is_box, meal_needs)
+                day_meals.append({
+                    "meal_time": meal_time,
+                    "meal_plan_requirements": meal_req,
+                    "used_items": used_items
+                })
+                if shortage_any:
+                    shortage_for_day = True
+                    break
 
         if shortage_for_day:
-            box_list = backup_box
-            main_list = backup_main
+            if day_meals:
+                # partially allocated before running short; undo the day
+                serv[:] = serv_snap
             day_shortages.append({
                 "day_number": day_num,
                 "shortages": [
@@ -354,7 +545,11 @@ def generate_monthly_plan(month=1):
             })
             day_meals = []
         else:
-            day_box_usage, day_main_usage = summarize_day_usage(day_meals)
+            for cat, need in DAILY_NEED.items():
+                cat_left[cat] -= need
+            day_box_usage, day_main_usage = summarize_day_usage(day_meals, items)
+            for meal in day_meals:
+                meal["used_items"] = describe_used(items, meal["used_items"])
 
         day_info = {
             "day_number": day_num,
@@ -364,21 +559,45 @@ def generate_monthly_plan(month=1):
             day_info["day_box_usage"] = day_box_usage
             day_info["day_main_usage"] = day_main_usage
 
-        day_plans.append(day_info)
+        yield day_info
 
+def build_all_shortages(day_shortages):
     all_shortages = []
     if day_shortages:
         all_shortages.append({
             "type": "meal_plan_shortage",
             "details": day_shortages
         })
+    return all_shortages
 
-    return {
+def start_monthly_plan(month=1):
+    """
+    Loads the inventory for `month` up front and returns
+      plan_head:     { month_requested, cycle_month, senior_box_items_for_month }
+      days:          iterator planning one day_info at a time
+      day_shortages: list filled in as `days` is consumed
+    """
+    # 1) Decide cycle
+    cyc = get_cycle_month(month)
+
+    # 2) Load reference, box and main (cached; read-only from here on)
+    box_original, box_list, main_list = load_plan_inventory(cyc)
+
+    plan_head = {
         "month_requested": month,
         "cycle_month": cyc,
-        "senior_box_items_for_month": box_original,
+        "senior_box_items_for_month": box_original
+    }
+    day_shortages = []
+    return plan_head, iter_day_plans(box_list, main_list, day_shortages), day_shortages
+
+def generate_monthly_plan(month=1):
+    plan_head, days, day_shortages = start_monthly_plan(month)
+    day_plans = list(days)
+    return {
+        **plan_head,
         "final_daily_plan": day_plans,
-        "all_shortages": all_shortages
+        "all_shortages": build_all_shortages(day_shortages)
     }
 
 
@@ -387,13 +606,40 @@ def generate_monthly_plan(month=1):
 ###############################################################################
 app = Flask(__name__)
 
+def dumps_json(obj):
+    # Sorted keys, and dates and other non-JSON types through Flask's own
+    # default, so objects come out as jsonify wrote them (e.g. HTTP date strings)
+    return orjson.dumps(
+        obj,
+        default=app.json.default,
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    )
+
+def stream_plan_json(head_json, first_day, days, day_shortages):
+    """
+    Writes the rest of the plan after the already-serialized head: the days
+    one at a time as they're planned, then all_shortages once they're known.
+    So unlike the head's (sorted) keys, these two always come last.
+    """
+    yield head_json[:-1] + (b"," if head_json != b"{}" else b"") + b'"final_daily_plan":['
+    if first_day is not None:
+        yield dumps_json(first_day)
+        for day_info in days:
+            yield b"," + dumps_json(day_info)
+    yield b'],"all_shortages":' + dumps_json(build_all_shortages(day_shortages)) + b"}"
+
 @app.route("/api/generate_monthly_plan", methods=["POST"])
 def generate_monthly_plan_endpoint():
     data = request.get_json()
     month_num = data.get("month", 1)
     try:
-        plan_result = generate_monthly_plan(month_num)
-        return jsonify(plan_result), 200
+        plan_head, days, day_shortages = start_monthly_plan(month_num)
+        # Serialize the head and plan the first day before answering, so
+        # load, encoding and setup errors still turn into a 500
+        head_json = dumps_json(plan_head)
+        first_day = next(days, None)
+        body = stream_plan_json(head_json, first_day, days, day_shortages)
+        return Response(stream_with_context(body), mimetype="application/json"), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -402,4 +648,12 @@ def home():
     return "Server running. Use POST /api/generate_monthly_plan with {'month':4}."
 
 if __name__ == "__main__":
+    # Load the workbooks before the first request arrives. The debug reloader
+    # runs this file twice, so only its serving child does it; if the data
+    # isn't there yet, requests load it (and report errors) instead.
+    if is_running_from_reloader():
+        try:
+            warm_inventory_cache()
+        except Exception as e:
+            print(f"Inventory not preloaded: {e}")
     app.run(debug=True, host="0.0.0.0", port=7778)
\ No newline at end of file
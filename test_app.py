@@ -1,5 +1,20 @@
+import datetime
+import json
+import os
+import shutil
+
+import flask
+import openpyxl
 import pytest
-from app import app
+from app import (
+    app, build_item_list, generate_monthly_plan, load_food_reference, load_main_inventory_items,
+    load_plan_inventory, summarize_day_usage, warm_inventory_cache, _read_sheet_rows, _sheet_records, Used,
+    DAILY_NEED
+)
+
+def plan_start(dummy_generate_monthly_plan):
+    """Wraps a dummy plan as start_monthly_plan's (plan_head, days, day_shortages)."""
+    return lambda month: (dummy_generate_monthly_plan(month), iter([]), [])
 
 # -------------------------------
 # Test Case 1: Sufficient Inventory
@@ -10,7 +25,7 @@ def test_sufficient_inventory(monkeypatch):
             "senior_box_items_for_month": ["itemA", "itemB"],
             "daily_usage": [{"day": i, "usage": 10} for i in range(1, 31)]
         }
-    monkeypatch.setattr("app.generate_monthly_plan", dummy_generate_monthly_plan)
+    monkeypatch.setattr("app.start_monthly_plan", plan_start(dummy_generate_monthly_plan))
     
     client = app.test_client()
     response = client.post("/api/generate_monthly_plan", json={"month": 4})
@@ -34,7 +49,7 @@ def test_shortage_in_main_inventory(monkeypatch):
                 for i in range(1, 31)
             ]
         }
-    monkeypatch.setattr("app.generate_monthly_plan", dummy_generate_monthly_plan)
+    monkeypatch.setattr("app.start_monthly_plan", plan_start(dummy_generate_monthly_plan))
     
     client = app.test_client()
     response = client.post("/api/generate_monthly_plan", json={"month": 4})
@@ -58,7 +73,7 @@ def test_shortage_in_both_inventories(monkeypatch):
                 for i in range(1, 31)
             ]
         }
-    monkeypatch.setattr("app.generate_monthly_plan", dummy_generate_monthly_plan)
+    monkeypatch.setattr("app.start_monthly_plan", plan_start(dummy_generate_monthly_plan))
     
     client = app.test_client()
     response = client.post("/api/generate_monthly_plan", json={"month": 4})
@@ -77,7 +92,7 @@ def test_invalid_month(monkeypatch):
         if month < 1 or month > 12:
             raise ValueError("Invalid month number")
         return {"senior_box_items_for_month": [], "daily_usage": []}
-    monkeypatch.setattr("app.generate_monthly_plan", dummy_generate_monthly_plan)
+    monkeypatch.setattr("app.start_monthly_plan", plan_start(dummy_generate_monthly_plan))
     
     client = app.test_client()
     response = client.post("/api/generate_monthly_plan", json={"month": 13})
@@ -95,7 +110,7 @@ def test_missing_month_key(monkeypatch):
             "senior_box_items_for_month": ["default_item"],
             "daily_usage": [{"day": i, "usage": 10} for i in range(1, 31)]
         }
-    monkeypatch.setattr("app.generate_monthly_plan", dummy_generate_monthly_plan)
+    monkeypatch.setattr("app.start_monthly_plan", plan_start(dummy_generate_monthly_plan))
     
     client = app.test_client()
     response = client.post("/api/generate_monthly_plan", json={})
@@ -103,4 +118,282 @@ def test_missing_month_key(monkeypatch):
 
     assert response.status_code == 200
     assert data["senior_box_items_for_month"] == ["default_item"]
-    assert len(data["daily_usage"]) == 30
\ No newline at end of file
+    assert len(data["daily_usage"]) == 30
+
+# -------------------------------
+# Workbook cache: a private copy of data/ and an empty cache per test
+# -------------------------------
+@pytest.fixture
+def data_copy(tmp_path, monkeypatch):
+    shutil.copytree(os.path.join(os.path.dirname(__file__), "data"), tmp_path / "data")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("app._EXCEL_CACHE", {})
+    return tmp_path / "data"
+
+def edit_column(path, sheet_name, column, value):
+    """Sets every data cell of `column` to `value` and moves the file's mtime forward."""
+    wb = openpyxl.load_workbook(path)
+    ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+    col = [c.value for c in ws[1]].index(column) + 1
+    for row in range(2, ws.max_row + 1):
+        ws.cell(row, col).value = value
+    wb.save(path)
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+
+# -------------------------------
+# Test Case 6: Cached Until the Workbook Changes on Disk
+# -------------------------------
+def test_cache_reloads_changed_workbook(data_copy):
+    ref_map = load_food_reference()
+    assert load_food_reference() is ref_map
+    main_list = load_main_inventory_items(ref_map)
+    assert load_main_inventory_items(ref_map) is main_list
+
+    edit_column(data_copy / "excel_file.xlsx", "Inventory", "quantity_in_stock", 7)
+
+    reloaded = load_main_inventory_items(ref_map)
+    assert reloaded is not main_list
+    ref_cat, ref_su = ref_map
+    for item in reloaded:
+        assert item["servings_available"] == 7 * ref_su[item["item_name"].strip().lower()]
+
+# -------------------------------
+# Helpers: plan a month over a small in-memory inventory
+# -------------------------------
+TEST_REF_MAP = (
+    {"apples": "fruit_veg", "bad apples": "fruit_veg", "bread": "cereal",
+     "milk": "dairy", "beans": "protein", "oil": "oil"},
+    {"apples": 1.0, "bad apples": 1.0, "bread": 1.0,
+     "milk": 1.0, "beans": 1.0, "oil": 1.0},
+)
+
+def plan_days(monkeypatch, box_rows, main_rows):
+    """Runs generate_monthly_plan on the given (item_name, quantity) rows."""
+    box_list = build_item_list([n for n, _ in box_rows], [q for _, q in box_rows], TEST_REF_MAP, "senior box")
+    main_list = build_item_list([n for n, _ in main_rows], [q for _, q in main_rows], TEST_REF_MAP, "main")
+    monkeypatch.setattr("app.load_plan_inventory", lambda cyc: ([], box_list, main_list))
+
+    plan = generate_monthly_plan(1)
+    day_shortages = [d for s in plan["all_shortages"] for d in s["details"]]
+    return plan["final_daily_plan"], day_shortages
+
+PLENTY = [("Bread", 1000.0), ("Milk", 1000.0), ("Beans", 1000.0), ("Oil", 1000.0)]
+
+# -------------------------------
+# Test Case 7: Negative Stock Doesn't Cause Shortages
+# -------------------------------
+def test_negative_servings_ignored_by_precheck(monkeypatch):
+    days, day_shortages = plan_days(monkeypatch, [], [("Bad apples", -500.0), ("Apples", 200.0)] + PLENTY)
+
+    assert day_shortages == []
+    assert all(day["meals"] for day in days)
+
+# -------------------------------
+# Test Case 8: Running Out Mid-Month (precheck and rollback paths)
+# -------------------------------
+def test_shortage_days_after_stock_runs_out(monkeypatch):
+    # 12 fruit/veg servings cover two days (5 per day) but not a third
+    box_rows = [("Apples", 7.0)]
+    main_rows = [("Apples", 5.0)] + PLENTY
+
+    days, day_shortages = plan_days(monkeypatch, box_rows, main_rows)
+
+    assert [d["day_number"] for d in day_shortages] == list(range(3, 31))
+    assert all(day["meals"] for day in days[:2])
+    assert all(day["meals"] == [] and "day_box_usage" not in day for day in days[2:])
+    # box stock is used before main stock
+    assert days[0]["day_box_usage"][0] == {"item_name": "Apples", "category": "fruit_veg", "servings_used": 5.0}
+    main_apples = [u for u in days[1]["day_main_usage"] if u["item_name"] == "Apples"]
+    assert main_apples == [{"item_name": "Apples", "category": "fruit_veg", "servings_used": 3.0}]
+
+    # With the precheck disabled, day 3 starts allocating and runs short
+    # mid-day instead; the plan comes out the same
+    monkeypatch.setattr("app.DAILY_NEED", {cat: 0 for cat in DAILY_NEED})
+    rolled_back_days, rolled_back_shortages = plan_days(monkeypatch, box_rows, main_rows)
+
+    assert rolled_back_days == days
+    assert rolled_back_shortages == day_shortages
+
+# -------------------------------
+# Test Case 9: Float Sums Just Under a Day's Need Still Plan the Day
+# -------------------------------
+def test_float_sum_just_under_need_is_planned(monkeypatch):
+    # These add up to 4.999999999999999 in floats, but cover 5 servings
+    fruit_veg = [0.2, 1.1, 0.1, 0.7, 0.3, 2/3, 0.3, 0.4, 2/3, 0.5666666666666664]
+
+    days, day_shortages = plan_days(monkeypatch, [("Apples", q) for q in fruit_veg], PLENTY)
+
+    assert days[0]["meals"]
+    assert [d["day_number"] for d in day_shortages] == list(range(2, 31))
+
+# -------------------------------
+# Test Case 10: Duplicate Inventory Rows Are Summed Together
+# -------------------------------
+def test_duplicate_rows_merged_in_day_usage():
+    ref_map = ({"rice": "cereal"}, {"rice": 1.0})
+    items = build_item_list(["Rice", "Rice"], [1.0, 3.0], ref_map, "senior box")
+    day_meals = [
+        {"used_items": [Used(0, 1.0, True)]},
+        {"used_items": [Used(1, 3.0, True)]},
+    ]
+
+    day_box_usage, day_main_usage = summarize_day_usage(day_meals, items)
+
+    assert day_box_usage == [
+        {"item_name": "Rice", "category": "cereal", "servings_used": 4.0}
+    ]
+    assert day_main_usage == []
+
+# -------------------------------
+# Test Case 11: Dates Serialize Like jsonify
+# -------------------------------
+def test_dates_in_box_items_match_jsonify(monkeypatch):
+    box_items = [{"item_name": "Rice", "expires": datetime.date(2024, 1, 2),
+                  "packed": datetime.datetime(2024, 1, 2, 3, 4)}]
+    monkeypatch.setattr("app.start_monthly_plan", lambda month: (
+        {"month_requested": month, "senior_box_items_for_month": box_items}, iter([]), []
+    ))
+
+    client = app.test_client()
+    response = client.post("/api/generate_monthly_plan", json={"month": 1})
+
+    assert response.status_code == 200
+    with app.app_context():
+        expected = json.loads(flask.json.dumps(box_items))
+    assert response.get_json()["senior_box_items_for_month"] == expected
+    assert expected[0]["expires"] == "Tue, 02 Jan 2024 00:00:00 GMT"
+    # keys sorted, as jsonify wrote them
+    assert response.get_data().index(b'"expires"') < response.get_data().index(b'"item_name"')
+
+# -------------------------------
+# Test Case 12: Sheet Records Match pandas.read_excel
+# -------------------------------
+# pandas isn't a dependency any more; these run wherever it's installed
+def typed(records):
+    """Records with each value as (type name, value), and NaN as "nan"."""
+    return [
+        {k: "nan" if v != v else (type(v).__name__, v) for k, v in r.items()}
+        for r in records
+    ]
+
+@pytest.mark.parametrize("path, sheet_name", [
+    ("data/senior_box.xlsx", "Senior Box First Month"),
+    ("data/senior_box.xlsx", "Senior Box Second Month"),
+    ("data/senior_box.xlsx", "Senior Box Third Month"),
+    ("data/DATA SET FOOD CATEGORY.xlsx", None),
+    ("data/excel_file.xlsx", "Inventory"),
+])
+def test_sheet_records_match_read_excel(data_copy, path, sheet_name):
+    pd = pytest.importorskip("pandas")
+    expected = pd.read_excel(path, sheet_name=sheet_name or 0).to_dict(orient="records")
+
+    assert typed(_sheet_records(*_read_sheet_rows(path, sheet_name))) == typed(expected)
+
+def test_sheet_records_match_read_excel_on_odd_sheet(tmp_path):
+    pd = pytest.importorskip("pandas")
+    wb = openpyxl.Workbook()
+    for row in [
+        ["item_name", "quantity", None, "quantity", "packed", "note"],
+        ["Rice", 2, 1.5, "3", True, "n/a"],
+        [None, None, None, None, None, None],
+        ["Beans", "4", 2, 1, None, 1],
+        ["Oil", "NA", "x", 2.5, False, True],
+        [None, None, None, None, None, None],
+    ]:
+        wb.active.append(row)
+    path = str(tmp_path / "odd.xlsx")
+    wb.save(path)
+
+    expected = pd.read_excel(path).to_dict(orient="records")
+
+    assert typed(_sheet_records(*_read_sheet_rows(path))) == typed(expected)
+
+# -------------------------------
+# Test Case 13: Reference Changes Refresh the Inventory Lists
+# -------------------------------
+def test_reference_change_refreshes_box_list(data_copy):
+    box_original, box_list, _ = load_plan_inventory(1)
+
+    edit_column(data_copy / "DATA SET FOOD CATEGORY.xlsx", None, "servings_per_unit", 3)
+
+    _, reloaded, _ = load_plan_inventory(1)
+    assert reloaded is not box_list
+    quantity = {r["item_name"]: r["quantity"] for r in box_original}
+    assert reloaded
+    for item in reloaded:
+        assert item["servings_available"] == 3 * quantity[item["item_name"]]
+
+# -------------------------------
+# Test Case 14: Warm-up Loads Every Cycle Month
+# -------------------------------
+def test_warm_inventory_cache_preloads_all_sheets(data_copy, monkeypatch):
+    warm_inventory_cache()
+
+    def fail_read(*args, **kwargs):
+        raise AssertionError("workbook re-read after warm-up")
+    monkeypatch.setattr("app._read_sheet_rows", fail_read)
+
+    for cyc in (1, 2, 3):
+        box_original, box_list, main_list = load_plan_inventory(cyc)
+        assert box_list and main_list
+
+# -------------------------------
+# Test Case 15: Streamed Days and Shortages
+# -------------------------------
+def test_streams_days_then_shortages(monkeypatch):
+    def dummy_start_monthly_plan(month):
+        day_shortages = []
+
+        def days():
+            for day_num in range(1, 4):
+                if day_num == 2:
+                    day_shortages.append({"day_number": 2, "shortages": ["short"]})
+                    yield {"day_number": 2, "meals": []}
+                else:
+                    yield {"meals": [{"meal_time": "Breakfast"}], "day_number": day_num}
+
+        head = {"month_requested": month, "cycle_month": 1, "senior_box_items_for_month": []}
+        return head, days(), day_shortages
+    monkeypatch.setattr("app.start_monthly_plan", dummy_start_monthly_plan)
+
+    client = app.test_client()
+    response = client.post("/api/generate_monthly_plan", json={"month": 4})
+    data = response.get_json()
+
+    assert response.status_code == 200
+    # head keys sorted like jsonify, then the streamed days and shortages
+    assert list(data) == ["cycle_month", "month_requested", "senior_box_items_for_month",
+                          "final_daily_plan", "all_shortages"]
+    assert list(data["final_daily_plan"][0]) == ["day_number", "meals"]
+    assert [d["day_number"] for d in data["final_daily_plan"]] == [1, 2, 3]
+    assert data["all_shortages"] == [{
+        "type": "meal_plan_shortage",
+        "details": [{"day_number": 2, "shortages": ["short"]}]
+    }]
+
+# -------------------------------
+# Test Case 16: Errors Before Streaming Still Return 500
+# -------------------------------
+def test_first_day_error_returns_500(monkeypatch):
+    def broken_days():
+        raise RuntimeError("planning failed")
+        yield
+
+    monkeypatch.setattr("app.start_monthly_plan", lambda month: ({"month_requested": month}, broken_days(), []))
+
+    client = app.test_client()
+    response = client.post("/api/generate_monthly_plan", json={"month": 1})
+
+    assert response.status_code == 500
+    assert "planning failed" in response.get_json()["error"]
+
+# -------------------------------
+# Test Case 17: generate_monthly_plan Returns Plain Data
+# -------------------------------
+def test_generate_monthly_plan_returns_lists():
+    plan = generate_monthly_plan(1)
+
+    assert isinstance(plan["final_daily_plan"], list)
+    assert len(plan["final_daily_plan"]) == 30
+    assert isinstance(plan["all_shortages"], list)